@@ -6,12 +6,16 @@ Integrates with existing RAG pipeline and manages chat history
 import os
 import sqlite3
 import json
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify
+import hashlib
+from datetime import datetime, timezone
+from flask import Flask, render_template, request, jsonify, url_for
 from flask_cors import CORS
+from flask_compress import Compress
+from werkzeug.http import is_resource_modified
 import chromadb
 from openai import OpenAI
 from dotenv import load_dotenv
+from chat_schema import upgrade_schema
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +26,19 @@ app = Flask(__name__,
             template_folder='templates')
 CORS(app)
 
+# gzip/brotli for HTML, CSS, JS and JSON responses. Static files are
+# streamed responses, which use the separate streaming list
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_ALGORITHM_STREAMING'] = ['br', 'gzip']
+Compress(app)
+
+# Fingerprinted static URLs never change content, so browsers may keep them
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+_static_hashes = {}
+
+# Millisecond precision so ETags change even for edits within the same second
+TIMESTAMP_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
 # Database setup
 DB_PATH = 'chat_history.db'
 
@@ -30,6 +47,11 @@ def init_db():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    # WAL lets maintain_db.py run while the app is serving; incremental
+    # auto-vacuum only takes effect on a fresh database (see maintain_db.py)
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    cursor.execute('PRAGMA journal_mode = WAL')
+    
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS chats (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -51,9 +73,53 @@ def init_db():
         )
     ''')
     
+    upgrade_schema(cursor)
+    
     conn.commit()
     conn.close()
 
+def save_sources(cursor, sources):
+    """Store a sources list once and return its message_sources id"""
+    content = json.dumps(sources)
+    cursor.execute('INSERT OR IGNORE INTO message_sources (content) VALUES (?)', (content,))
+    cursor.execute('SELECT id FROM message_sources WHERE content = ?', (content,))
+    return cursor.fetchone()[0]
+
+def parse_timestamp(value):
+    """
+    Convert a SQLite UTC timestamp into a datetime for Last-Modified.
+    Last-Modified only has whole seconds, so nothing is returned while the
+    timestamp's second is still in progress: a later update in that same
+    second would otherwise look unmodified to If-Modified-Since clients.
+    """
+    if not value:
+        return None
+    last_modified = datetime.fromisoformat(value).replace(microsecond=0, tzinfo=timezone.utc)
+    if last_modified >= datetime.now(timezone.utc).replace(microsecond=0):
+        return None
+    return last_modified
+
+def conditional_json(etag_source, build, updated_at=None):
+    """
+    Return build() as JSON with an ETag (and Last-Modified when updated_at
+    is given), or an empty 304 without calling build() when the client's
+    cached copy is current
+    """
+    etag = hashlib.sha1(etag_source.encode('utf-8')).hexdigest()
+    last_modified = parse_timestamp(updated_at)
+    
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = jsonify(build())
+    else:
+        response = app.response_class(status=304)
+    
+    # Weak ETag: the same JSON may go out gzip or brotli encoded
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
 # Initialize database on startup
 init_db()
 
@@ -149,6 +215,40 @@ Current Question: {question}
         return f"Error calling LLM: {str(e)}", []
 
 
+# ==================== STATIC ASSETS ====================
+
+def static_hash(filename):
+    """Short content hash of a static file, recomputed when it changes"""
+    path = os.path.join(app.static_folder, filename)
+    mtime = os.path.getmtime(path)
+    cached = _static_hashes.get(filename)
+    if not cached or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = (mtime, hashlib.md5(f.read()).hexdigest()[:8])
+        _static_hashes[filename] = cached
+    return cached[1]
+
+@app.template_global()
+def static_url(filename):
+    """URL for a static file with a content hash, e.g. style.css?v=1a2b3c4d"""
+    return url_for('static', filename=filename, v=static_hash(filename))
+
+@app.after_request
+def cache_static_assets(response):
+    """
+    Long-lived immutable caching for fingerprinted static files. Stale or
+    made-up ?v= values keep Flask's default no-cache headers.
+    """
+    if (response.status_code == 200
+            and request.endpoint == 'static'
+            and request.args.get('v') == static_hash(request.view_args['filename'])):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
 # ==================== ROUTES ====================
 
 @app.route('/')
@@ -179,6 +279,13 @@ def api_chat():
     if chat_id:
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
+        
+        # The chat may have been deleted or archived by maintain_db.py
+        cursor.execute('SELECT 1 FROM chats WHERE id = ?', (chat_id,))
+        if not cursor.fetchone():
+            conn.close()
+            return jsonify({'error': 'Chat not found'}), 404
+        
         cursor.execute('''
             SELECT role, content FROM messages 
             WHERE chat_id = ? 
@@ -195,6 +302,16 @@ def api_chat():
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         
+        # Bump the timestamp first: this opens the write transaction, so the
+        # chat cannot be archived between this check and the inserts below
+        cursor.execute(f'''
+            UPDATE chats SET updated_at = {TIMESTAMP_NOW} WHERE id = ?
+        ''', (chat_id,))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            conn.close()
+            return jsonify({'error': 'Chat not found'}), 404
+        
         # Save user message
         cursor.execute('''
             INSERT INTO messages (chat_id, role, content)
@@ -203,14 +320,9 @@ def api_chat():
         
         # Save assistant response
         cursor.execute('''
-            INSERT INTO messages (chat_id, role, content, sources)
+            INSERT INTO messages (chat_id, role, content, sources_id)
             VALUES (?, 'assistant', ?, ?)
-        ''', (chat_id, answer, json.dumps(sources)))
-        
-        # Update chat timestamp and title if first message
-        cursor.execute('''
-            UPDATE chats SET updated_at = CURRENT_TIMESTAMP WHERE id = ?
-        ''', (chat_id,))
+        ''', (chat_id, answer, save_sources(cursor, sources)))
         
         # Update title if it's the default
         cursor.execute('SELECT title FROM chats WHERE id = ?', (chat_id,))
@@ -234,22 +346,33 @@ def get_chats():
     """Get all chat sessions"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id, title, created_at, updated_at 
-        FROM chats 
-        ORDER BY updated_at DESC
-    ''')
-    chats = [
-        {
-            'id': row[0],
-            'title': row[1],
-            'created_at': row[2],
-            'updated_at': row[3]
-        }
-        for row in cursor.fetchall()
-    ]
+    
+    # Creates, renames and new messages bump updated_at; deletes change the
+    # count and id total, so this summary changes whenever the list does
+    cursor.execute('SELECT COUNT(*), MAX(updated_at), TOTAL(id) FROM chats')
+    count, last_updated, id_total = cursor.fetchone()
+    
+    def build():
+        cursor.execute('''
+            SELECT id, title, created_at, updated_at 
+            FROM chats 
+            ORDER BY updated_at DESC
+        ''')
+        return [
+            {
+                'id': row[0],
+                'title': row[1],
+                'created_at': row[2],
+                'updated_at': row[3]
+            }
+            for row in cursor.fetchall()
+        ]
+    
+    # ETag only: MAX(updated_at) does not move when a chat is deleted or
+    # archived, so a Last-Modified date could hide those changes
+    response = conditional_json(f'chats:{count}:{last_updated}:{id_total}', build)
     conn.close()
-    return jsonify(chats)
+    return response
 
 
 @app.route('/api/chats', methods=['POST'])
@@ -257,8 +380,8 @@ def create_chat():
     """Create a new chat session"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO chats (title) VALUES ('New Conversation')
+    cursor.execute(f'''
+        INSERT INTO chats (title, updated_at) VALUES ('New Conversation', {TIMESTAMP_NOW})
     ''')
     chat_id = cursor.lastrowid
     conn.commit()
@@ -273,40 +396,44 @@ def get_chat(chat_id):
     cursor = conn.cursor()
     
     # Get chat info
-    cursor.execute('SELECT id, title, created_at FROM chats WHERE id = ?', (chat_id,))
+    cursor.execute('SELECT id, title, created_at, updated_at FROM chats WHERE id = ?', (chat_id,))
     chat_row = cursor.fetchone()
     
     if not chat_row:
         conn.close()
         return jsonify({'error': 'Chat not found'}), 404
     
-    # Get messages
-    cursor.execute('''
-        SELECT id, role, content, sources, created_at 
-        FROM messages 
-        WHERE chat_id = ? 
-        ORDER BY created_at ASC
-    ''', (chat_id,))
-    
-    messages = [
-        {
-            'id': row[0],
-            'role': row[1],
-            'content': row[2],
-            'sources': json.loads(row[3]) if row[3] else [],
-            'created_at': row[4]
+    def build():
+        # Get messages (skipped entirely when the client gets a 304)
+        cursor.execute('''
+            SELECT m.id, m.role, m.content, COALESCE(s.content, m.sources), m.created_at 
+            FROM messages m
+            LEFT JOIN message_sources s ON s.id = m.sources_id
+            WHERE m.chat_id = ? 
+            ORDER BY m.created_at ASC
+        ''', (chat_id,))
+        
+        messages = [
+            {
+                'id': row[0],
+                'role': row[1],
+                'content': row[2],
+                'sources': json.loads(row[3]) if row[3] else [],
+                'created_at': row[4]
+            }
+            for row in cursor.fetchall()
+        ]
+        
+        return {
+            'id': chat_row[0],
+            'title': chat_row[1],
+            'created_at': chat_row[2],
+            'messages': messages
         }
-        for row in cursor.fetchall()
-    ]
     
+    response = conditional_json(f'chat:{chat_id}:{chat_row[3]}', build, chat_row[3])
     conn.close()
-    
-    return jsonify({
-        'id': chat_row[0],
-        'title': chat_row[1],
-        'created_at': chat_row[2],
-        'messages': messages
-    })
+    return response
 
 
 @app.route('/api/chats/<int:chat_id>', methods=['DELETE'])
@@ -329,7 +456,7 @@ def rename_chat(chat_id):
     
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
-    cursor.execute('UPDATE chats SET title = ? WHERE id = ?', (new_title, chat_id))
+    cursor.execute(f'UPDATE chats SET title = ?, updated_at = {TIMESTAMP_NOW} WHERE id = ?', (new_title, chat_id))
     conn.commit()
     conn.close()
     
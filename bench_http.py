@@ -0,0 +1,66 @@
+"""
+Bytes-on-wire and server CPU for chat polling and static assets
+Compares a plain client (no compression, no cache validators) with a
+browser-like client that sends Accept-Encoding and revalidates with ETags.
+
+Usage: python bench_http.py [requests_per_case]
+"""
+
+import sys
+import time
+from app import app, static_url
+
+PLAIN = {}
+GZIP = {'Accept-Encoding': 'gzip'}
+BROWSER = {'Accept-Encoding': 'br, gzip'}
+
+
+def measure(client, url, headers, repeat):
+    """Average response bytes and server CPU milliseconds per request"""
+    total_bytes = 0
+    start = time.process_time()
+    for _ in range(repeat):
+        response = client.get(url, headers=headers)
+        total_bytes += len(response.get_data())
+    cpu_ms = (time.process_time() - start) * 1000
+    return total_bytes / repeat, cpu_ms / repeat, response
+
+
+def compare(client, label, url, repeat):
+    plain_bytes, plain_cpu, _ = measure(client, url, PLAIN, repeat)
+    gz_bytes, gz_cpu, gz_response = measure(client, url, GZIP, repeat)
+    br_bytes, br_cpu, response = measure(client, url, BROWSER, repeat)
+
+    print(f"{label}")
+    print(f"  plain:        {plain_bytes:>10.0f} B  {plain_cpu:>7.3f} ms")
+    print(f"  gzip only:    {gz_bytes:>10.0f} B  {gz_cpu:>7.3f} ms  ({gz_response.headers.get('Content-Encoding', 'none')})")
+    print(f"  br, gzip:     {br_bytes:>10.0f} B  {br_cpu:>7.3f} ms  ({response.headers.get('Content-Encoding', 'none')})")
+
+    etag = response.headers.get('ETag')
+    if etag:
+        revalidate = dict(BROWSER, **{'If-None-Match': etag})
+        cached_bytes, cached_cpu, cached = measure(client, url, revalidate, repeat)
+        print(f"  revalidated:  {cached_bytes:>10.0f} B  {cached_cpu:>7.3f} ms  ({cached.status_code})")
+
+    cache_control = response.headers.get('Cache-Control')
+    if cache_control:
+        print(f"  Cache-Control: {cache_control}")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    client = app.test_client()
+
+    chats = client.get('/api/chats').get_json()
+    compare(client, "GET /api/chats", '/api/chats', repeat)
+    if chats:
+        compare(client, f"GET /api/chats/{chats[0]['id']}", f"/api/chats/{chats[0]['id']}", repeat)
+
+    with app.test_request_context():
+        assets = [static_url(name) for name in ('css/style.css', 'js/chat.js', 'images/ap-hero.png')]
+    for url in assets:
+        compare(client, f"GET {url}", url, repeat)
+
+
+if __name__ == "__main__":
+    main()
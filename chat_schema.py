@@ -0,0 +1,31 @@
+"""
+Chat history schema upgrades shared by app.py's init_db and maintain_db.py
+Applied on top of the original chats/messages tables; safe to run repeatedly
+"""
+
+
+def upgrade_schema(cursor):
+    """Add the sources lookup table and the indexes the app and maintenance job rely on"""
+    # Identical sources JSON strings are stored once and shared by messages
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS message_sources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL UNIQUE
+        )
+    ''')
+
+    cursor.execute('PRAGMA table_info(messages)')
+    if 'sources_id' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE messages ADD COLUMN sources_id INTEGER REFERENCES message_sources (id)')
+
+    # Loading a chat's messages (and archiving a batch of chats) by chat_id
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_messages_chat_id
+        ON messages (chat_id, created_at)
+    ''')
+
+    # Listing chats by recency and finding chats older than the archive cutoff
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_chats_updated_at
+        ON chats (updated_at)
+    ''')
@@ -6,7 +6,7 @@ import time
 import trafilatura
 import json
 
-def get_article_links(topic_url):
+def get_article_links(topic_url, topic_id=None):
     # Setup Chrome options (headless = no visible UI window)
     options = webdriver.ChromeOptions()
     options.add_argument('--headless') 
@@ -41,7 +41,7 @@ def get_article_links(topic_url):
             if not title:
                 title = "No Title Found"
             
-            results.append({'title': title, 'url': url})
+            results.append({'title': title, 'url': url, 'topic_id': topic_id})
             seen_urls.add(url)
             
     driver.quit()
@@ -79,19 +79,28 @@ def chunk_text(text, chunk_size=1000, overlap=100):
 
 
 # Run the function
+# Keep links from every topic (not just the last one) and remember which topic
+# each article came from, so chunks can be partitioned by topic in the VDB.
+links = []
+seen_article_urls = set()
 for i in range(1,259):
     topic_url = f"https://acharyaprashant.org/en/articles/topic/{i}"
-    links = get_article_links(topic_url)
+    topic_links = get_article_links(topic_url, topic_id=i)
 
-    print(f"Found {len(links)} articles:")
-    for link in links:
+    print(f"Found {len(topic_links)} articles:")
+    for link in topic_links:
         print(f"- {link['url']}")
+        # An article listed under several topics is stored once, under the
+        # first topic it was found in (Chroma ids must be unique)
+        if link['url'] not in seen_article_urls:
+            links.append(link)
+            seen_article_urls.add(link['url'])
     # print(text)
 
 
 #Run a single topic 
 # example_topic = f"https://acharyaprashant.org/en/articles/topic/69"
-# links = get_article_links(example_topic)
+# links = get_article_links(example_topic, topic_id=69)
 # print(f"Found {len(links)} articles:")
 # for link in links:
 #     print(f"- {link['url']}")
@@ -125,6 +134,7 @@ for link in links:
                 "text": chunk,              # The content to embed
                 "metadata": {               # Data to filter by later
                     "source": link['url'],
+                    "topic_id": link['topic_id'],
                     "chunk_index": i
                 }
             }
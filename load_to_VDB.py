@@ -1,8 +1,9 @@
 import chromadb
 import json
+from topic_router import COLLECTION_NAME, UNKNOWN_TOPIC, embed, upsert_in_batches, build_centroids
 
 chroma_client = chromadb.PersistentClient(path="./my_chroma_db")
-collection = chroma_client.get_or_create_collection(name="articles_KB")
+collection = chroma_client.get_or_create_collection(name=COLLECTION_NAME)
 
 #Read JSONL file
 ids = []
@@ -14,11 +15,18 @@ with open('knowledge_base.jsonl', 'r') as f:
         data = json.loads(line)
         ids.append(data['id'])
         documents.append(data['text'])
-        metadata.append(data['metadata'])
+        meta = data['metadata']
+        meta.setdefault('topic_id', UNKNOWN_TOPIC)
+        metadata.append(meta)
 
-collection.add(
-    ids=ids,
-    documents=documents,
-    metadatas=metadata
-    )
-print('Data Loaded into ChromaDB!')
+#Upsert so re-runs refresh topic ids, then drop chunks no longer in the file
+embeddings = embed(documents)
+upsert_in_batches(collection, ids, documents, metadata, embeddings)
+
+stale = list(set(collection.get(include=[])['ids']) - set(ids))
+for start in range(0, len(stale), 5000):
+    collection.delete(ids=stale[start:start + 5000])
+print(f'Data Loaded into ChromaDB! ({len(stale)} stale chunks removed)')
+
+topic_count = build_centroids(chroma_client, metadata, embeddings)
+print(f'Built centroids for {topic_count} topics for query routing!')
@@ -0,0 +1,313 @@
+"""
+Chat history maintenance job
+Archives old chats to compressed monthly files, deduplicates message sources
+and reclaims free pages, reporting size and query latency before and after.
+
+Safe to run while app.py is serving: the database is in WAL mode and every
+step works in short batched transactions, so requests only wait briefly.
+Chats are re-checked inside each archive batch's write transaction.
+
+Usage: python maintain_db.py [--days 90] [--archive-dir chat_archive] [--full-vacuum]
+"""
+
+import os
+import gzip
+import shutil
+import json
+import time
+import sqlite3
+import argparse
+import statistics
+from chat_schema import upgrade_schema
+
+DB_PATH = 'chat_history.db'
+ARCHIVE_DIR = 'chat_archive'
+BATCH_SIZE = 100
+BUSY_TIMEOUT = 30
+# Gap between write batches so the app's waiting writers get the lock
+BATCH_PAUSE = 0.05
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    conn.execute('PRAGMA journal_mode = WAL')
+    return conn
+
+
+def ensure_schema(conn):
+    """Apply the same schema upgrades as app.py's init_db"""
+    upgrade_schema(conn.cursor())
+    conn.commit()
+
+
+# ==================== REPORTING ====================
+
+def database_size(db_path):
+    """Bytes on disk for the database and its WAL file"""
+    total = 0
+    for path in (db_path, db_path + '-wal'):
+        if os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def time_query(conn, sql, params=(), repeat=20):
+    """Median latency of a query in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def collect_stats(conn, db_path):
+    """Size and latency of the queries behind /api/chats and /api/chats/<id>"""
+    stats = {
+        'size_bytes': database_size(db_path),
+        'free_pages': conn.execute('PRAGMA freelist_count').fetchone()[0],
+        'chats': conn.execute('SELECT COUNT(*) FROM chats').fetchone()[0],
+        'messages': conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0],
+    }
+
+    stats['list_ms'] = time_query(conn, '''
+        SELECT id, title, created_at, updated_at
+        FROM chats
+        ORDER BY updated_at DESC
+    ''')
+
+    latest = conn.execute('SELECT id FROM chats ORDER BY updated_at DESC LIMIT 1').fetchone()
+    stats['chat_ms'] = time_query(conn, '''
+        SELECT m.id, m.role, m.content, COALESCE(s.content, m.sources), m.created_at
+        FROM messages m
+        LEFT JOIN message_sources s ON s.id = m.sources_id
+        WHERE m.chat_id = ?
+        ORDER BY m.created_at ASC
+    ''', (latest[0],)) if latest else 0.0
+
+    return stats
+
+
+def print_report(before, after):
+    print("-" * 50)
+    print(f"{'':<18}{'before':>14}{'after':>14}")
+    print(f"{'Size (KB)':<18}{before['size_bytes'] / 1024:>14.1f}{after['size_bytes'] / 1024:>14.1f}")
+    print(f"{'Free pages':<18}{before['free_pages']:>14}{after['free_pages']:>14}")
+    print(f"{'Chats':<18}{before['chats']:>14}{after['chats']:>14}")
+    print(f"{'Messages':<18}{before['messages']:>14}{after['messages']:>14}")
+    print(f"{'List chats (ms)':<18}{before['list_ms']:>14.3f}{after['list_ms']:>14.3f}")
+    print(f"{'Get chat (ms)':<18}{before['chat_ms']:>14.3f}{after['chat_ms']:>14.3f}")
+    print("-" * 50)
+
+
+# ==================== MAINTENANCE STEPS ====================
+
+def write_part(archive_dir, month, records):
+    """
+    Write one batch's records to a new part file next to the month archive.
+    The part is written under a .tmp name, fsynced and renamed, so it is
+    either complete or absent; its size is bounded by BATCH_SIZE.
+    """
+    path = os.path.join(archive_dir, f'chats-{month}.part-{time.time_ns()}.jsonl.gz')
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    with open(tmp_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def merge_parts(archive_dir):
+    """
+    Fold part files into their month archive, once per month per run and
+    outside any database transaction. Gzip members concatenate into a valid
+    gzip file, so the parts are appended as raw bytes to a copy of the month
+    file, which then atomically replaces it. A crash before the parts are
+    removed can only duplicate their lines on the next merge.
+    """
+    parts = {}
+    for name in sorted(os.listdir(archive_dir)):
+        if '.part-' in name and name.endswith('.jsonl.gz'):
+            parts.setdefault(name.split('.part-')[0], []).append(os.path.join(archive_dir, name))
+
+    for month_name, part_paths in parts.items():
+        path = os.path.join(archive_dir, f'{month_name}.jsonl.gz')
+        tmp_path = path + '.tmp'
+        if os.path.exists(path):
+            shutil.copyfile(path, tmp_path)
+        elif os.path.exists(tmp_path):
+            os.remove(tmp_path)  # Left over from an interrupted merge
+        with open(tmp_path, 'ab') as out:
+            for part_path in part_paths:
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+
+        for part_path in part_paths:
+            os.remove(part_path)
+
+
+def archive_old_chats(conn, days, archive_dir):
+    """
+    Move chats not updated in `days` days to gzip JSONL files, one per month.
+    Each batch is selected, written to a part file and deleted inside one
+    BEGIN IMMEDIATE transaction, so the app cannot add messages to a chat in
+    between; the lock is held only for indexed reads and a small file write.
+    Parts are merged into the month files afterwards (and on the next run if
+    this one is interrupted), so no chat is lost, only possibly duplicated.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    merge_parts(archive_dir)
+
+    cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{days} days',)).fetchone()[0]
+    archived = 0
+
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            chats = conn.execute('''
+                SELECT id, title, created_at, updated_at
+                FROM chats
+                WHERE updated_at < ?
+                ORDER BY updated_at
+                LIMIT ?
+            ''', (cutoff, BATCH_SIZE)).fetchall()
+            if not chats:
+                conn.rollback()
+                break
+
+            ids = [row[0] for row in chats]
+            placeholders = ', '.join('?' * len(ids))
+            messages = {}
+            for row in conn.execute(f'''
+                SELECT m.chat_id, m.role, m.content, COALESCE(s.content, m.sources), m.created_at
+                FROM messages m
+                LEFT JOIN message_sources s ON s.id = m.sources_id
+                WHERE m.chat_id IN ({placeholders})
+                ORDER BY m.chat_id, m.created_at ASC
+            ''', ids):
+                messages.setdefault(row[0], []).append({
+                    'role': row[1],
+                    'content': row[2],
+                    'sources': json.loads(row[3]) if row[3] else [],
+                    'created_at': row[4]
+                })
+
+            by_month = {}
+            for chat_id, title, created_at, updated_at in chats:
+                by_month.setdefault(updated_at[:7], []).append({
+                    'id': chat_id,
+                    'title': title,
+                    'created_at': created_at,
+                    'updated_at': updated_at,
+                    'messages': messages.get(chat_id, [])
+                })
+
+            for month, records in by_month.items():
+                write_part(archive_dir, month, records)
+
+            conn.execute(f'DELETE FROM messages WHERE chat_id IN ({placeholders})', ids)
+            conn.execute(f'DELETE FROM chats WHERE id IN ({placeholders})', ids)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        archived += len(chats)
+        time.sleep(BATCH_PAUSE)
+
+    merge_parts(archive_dir)
+    return archived
+
+
+def dedupe_sources(conn):
+    """Move inline sources JSON into message_sources and drop unused entries"""
+    moved = 0
+    last_id = 0
+
+    while True:
+        # Keyset paging: each batch resumes after the last id, via the primary key
+        rows = conn.execute('''
+            SELECT id, sources FROM messages
+            WHERE id > ? AND sources IS NOT NULL
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+
+        with conn:
+            for message_id, sources in rows:
+                conn.execute('INSERT OR IGNORE INTO message_sources (content) VALUES (?)', (sources,))
+                conn.execute('''
+                    UPDATE messages
+                    SET sources_id = (SELECT id FROM message_sources WHERE content = ?),
+                        sources = NULL
+                    WHERE id = ?
+                ''', (sources, message_id))
+        moved += len(rows)
+        last_id = rows[-1][0]
+        time.sleep(BATCH_PAUSE)
+
+    with conn:
+        removed = conn.execute('''
+            DELETE FROM message_sources
+            WHERE id NOT IN (SELECT sources_id FROM messages WHERE sources_id IS NOT NULL)
+        ''').rowcount
+
+    return moved, removed
+
+
+def reclaim_space(conn, full_vacuum=False):
+    """
+    Release free pages with incremental vacuum. Databases created before
+    auto_vacuum was enabled need one full VACUUM (--full-vacuum) to switch
+    modes; that briefly blocks writers, so it is opt-in.
+    """
+    auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    if auto_vacuum == 2:
+        # execute() would stop after the first freed page; executescript
+        # steps the pragma to completion
+        conn.executescript('PRAGMA incremental_vacuum;')
+    elif full_vacuum:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+    else:
+        print("Incremental vacuum is not enabled on this database; "
+              "run once with --full-vacuum during a quiet period.")
+
+    # Fold the WAL back into the database file so its size is reported fairly
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive, deduplicate and compact chat_history.db")
+    parser.add_argument('--db', default=DB_PATH, help="Path to the chat database")
+    parser.add_argument('--days', type=int, default=90, help="Archive chats not updated for this many days")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR, help="Where monthly archive files are written")
+    parser.add_argument('--full-vacuum', action='store_true', help="Run a one-time VACUUM to enable incremental vacuum")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    ensure_schema(conn)
+
+    before = collect_stats(conn, args.db)
+
+    archived = archive_old_chats(conn, args.days, args.archive_dir)
+    print(f"Archived {archived} chats older than {args.days} days to {args.archive_dir}/")
+
+    moved, removed = dedupe_sources(conn)
+    print(f"Moved {moved} sources into the lookup table, removed {removed} unused entries")
+
+    reclaim_space(conn, args.full_vacuum)
+
+    after = collect_stats(conn, args.db)
+    conn.close()
+
+    print_report(before, after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Topic centroids for the articles knowledge base, and an offline evaluation
+of routing each question to its closest topics (by centroid similarity)
+against a full search of `articles_KB`. The app itself does not route:
+on Chroma's single HNSW index, the filtered search was slower than a full one.
+"""
+
+import sys
+import time
+
+import numpy as np
+import chromadb
+from chromadb.utils import embedding_functions
+
+COLLECTION_NAME = "articles_KB"
+CENTROIDS_NAME = "articles_KB_topics"
+
+# Chunks ingested before topic ids were tracked get this topic id
+UNKNOWN_TOPIC = 0
+
+# Held-out questions for evaluate(), written by hand rather than cut from chunks
+EVAL_QUESTIONS = "eval_questions.txt"
+
+# Same mini-LM model Chroma uses by default, so stored and query vectors match
+embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+
+
+def embed(texts, batch_size=256):
+    """Embed texts in batches, returning plain lists of floats"""
+    embeddings = []
+    for start in range(0, len(texts), batch_size):
+        batch = embedding_fn(texts[start:start + batch_size])
+        embeddings.extend(np.asarray(vec, dtype=float).tolist() for vec in batch)
+    return embeddings
+
+
+def upsert_in_batches(collection, ids, documents, metadatas, embeddings, batch_size=5000):
+    """Upsert records without exceeding Chroma's max batch size"""
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        collection.upsert(
+            ids=ids[start:end],
+            documents=documents[start:end],
+            metadatas=metadatas[start:end],
+            embeddings=embeddings[start:end]
+        )
+
+
+def build_centroids(chroma_client, metadatas, embeddings):
+    """
+    Rebuild the topic centroid collection from scratch, so topics that were
+    removed or re-assigned since the last load leave nothing behind.
+    Returns the number of topics.
+    """
+    groups = {}
+    for i, meta in enumerate(metadatas):
+        groups.setdefault(meta.get('topic_id', UNKNOWN_TOPIC), []).append(i)
+
+    try:
+        chroma_client.delete_collection(name=CENTROIDS_NAME)
+    except Exception:
+        pass  # First load: nothing to drop
+    centroids = chroma_client.create_collection(name=CENTROIDS_NAME)
+
+    ids = []
+    vectors = []
+    metas = []
+    for topic_id, rows in groups.items():
+        # Centroid = normalised mean of the topic's chunk embeddings
+        centroid = np.mean([embeddings[i] for i in rows], axis=0)
+        norm = np.linalg.norm(centroid)
+        if norm:
+            centroid = centroid / norm
+
+        ids.append(f"topic_{topic_id}")
+        vectors.append(centroid.tolist())
+        metas.append({'topic_id': topic_id, 'size': len(rows)})
+
+    if ids:
+        centroids.add(ids=ids, embeddings=vectors, metadatas=metas)
+
+    return len(groups)
+
+
+class TopicRouter:
+    """
+    Searches only chunks from the `top_topics` topics nearest to the question.
+    Used by evaluate(); needs the collections built by load_to_VDB.py.
+    """
+
+    def __init__(self, chroma_client, top_topics=3):
+        self.top_topics = top_topics
+        self.full = chroma_client.get_collection(name=COLLECTION_NAME)
+        self.centroids = chroma_client.get_collection(name=CENTROIDS_NAME)
+
+    def query_full(self, question, n_results=3, query_embedding=None):
+        """Exhaustive search over every chunk"""
+        if query_embedding is None:
+            query_embedding = embed([question])[0]
+        return self.full.query(query_embeddings=[query_embedding], n_results=n_results)
+
+    def route(self, query_embedding):
+        """Return (topic id, chunk count) for the nearest topic centroids"""
+        topic_count = self.centroids.count()
+        if topic_count == 0:
+            return []
+
+        nearest = self.centroids.query(
+            query_embeddings=[query_embedding],
+            n_results=min(self.top_topics, topic_count),
+            include=['metadatas']
+        )
+        return [(meta['topic_id'], meta.get('size', 0)) for meta in nearest['metadatas'][0]]
+
+    def query_routed(self, query_embedding, n_results=3):
+        """Search only the nearest topics; None if they cannot fill n_results"""
+        routes = self.route(query_embedding)
+        if sum(size for _, size in routes) < n_results:
+            return None
+
+        results = self.full.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where={'topic_id': {'$in': [topic_id for topic_id, _ in routes]}}
+        )
+        if len(results['ids'][0]) < n_results:
+            return None
+        return results
+
+
+def evaluate(router, questions, n_results=3):
+    """Compare routed search against full search: recall@n and mean latency"""
+    recall_total = 0.0
+    full_time = 0.0
+    routed_time = 0.0
+
+    for question in questions:
+        query_embedding = embed([question])[0]
+
+        start = time.perf_counter()
+        full = router.query_full(question, n_results, query_embedding)
+        full_time += time.perf_counter() - start
+
+        # Time routing + filtered search only, not the shared embedding step
+        start = time.perf_counter()
+        routed = router.query_routed(query_embedding, n_results)
+        if routed is None:
+            routed = router.query_full(question, n_results, query_embedding)
+        routed_time += time.perf_counter() - start
+
+        expected = set(full['ids'][0])
+        if expected:
+            recall_total += len(expected & set(routed['ids'][0])) / len(expected)
+
+    count = max(len(questions), 1)
+    return {
+        'queries': len(questions),
+        'recall': recall_total / count,
+        'full_ms': full_time / count * 1000,
+        'routed_ms': routed_time / count * 1000
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python topic_router.py [questions.txt] [top_topics]
+    questions_path = sys.argv[1] if len(sys.argv) > 1 else EVAL_QUESTIONS
+    top_topics = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    chroma_client = chromadb.PersistentClient(path="./my_chroma_db")
+    router = TopicRouter(chroma_client, top_topics=top_topics)
+
+    with open(questions_path, 'r', encoding='utf-8') as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    report = evaluate(router, questions)
+    print(f"Queries:        {report['queries']}")
+    print(f"Top topics:     {top_topics}")
+    print(f"Recall@3:       {report['recall']:.3f}")
+    print(f"Full search:    {report['full_ms']:.2f} ms/query")
+    print(f"Routed search:  {report['routed_ms']:.2f} ms/query")